@@ -1,154 +1,516 @@
 """Database operations for device tracking."""
 
 import os
-import datetime
+import asyncio
 import logging
-from typing import Optional, List
-
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, update, text
-
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional, List, Dict, Iterable, Sequence, Set, Tuple, AsyncIterator
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import select, update, delete, text, func, and_, or_, bindparam, inspect, Row
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from .cache import TTLCache
+from .loader import BatchLoader
 from .models import Device, ManufacturerStatus, Base
 
 logger = logging.getLogger(__name__)
 
-
-class Database:
+# MySQL named lock held while creating the schema
+SCHEMA_LOCK = 'router_events_migrate'
+
+# Indexes replaced by wider ones, dropped when the schema is upgraded
+SUPERSEDED_INDEXES = {'devices': ('idx_device_listing',)}
+
+# Longest device name the column stores
+NAME_LENGTH = Device.name.type.length
+
+# Maximum number of queued device upserts written in one statement
+DEVICE_BATCH_SIZE = 500
+
+# Rows fetched from the server-side cursor at a time when streaming the device list
+DEVICE_STREAM_BATCH = 500
+
+# Devices written within this many seconds are not written again
+RECENT_DEVICES_SIZE = 50000
+RECENT_DEVICES_TTL = 60
+
+# Device rows are cached briefly to absorb bursts of events for the same MAC
+DEVICE_CACHE_SIZE = 4096
+DEVICE_CACHE_TTL = 5
+
+# Maximum number of MACs in one IN (...) list
+IN_CHUNK_SIZE = 1000
+
+# Found and unknown manufacturers rarely change, so they are cached in-process
+MANUFACTURER_CACHE_SIZE = 10000
+MANUFACTURER_CACHE_TTL = 600
+
+# Columns returned when reading devices
+DEVICE_COLUMNS = (
+    Device.mac, Device.name, Device.notify, Device.manufacturer,
+    Device.first_seen, Device.last_seen
+)
+
+# Statements used per request, built once and run with bound parameters
+_MAC = bindparam("mac")
+_MACS = bindparam("macs", expanding=True)
+_NO_SYNC = {"synchronize_session": False}
+
+_GET_DEVICES = select(*DEVICE_COLUMNS).where(Device.mac.in_(_MACS))
+
+_SET_NAME = (
+    update(Device).where(Device.mac == _MAC).values(name=bindparam("name"))
+    .execution_options(**_NO_SYNC)
+)
+_SET_NOTIFY = (
+    update(Device).where(Device.mac == _MAC).values(notify=bindparam("notify"))
+    .execution_options(**_NO_SYNC)
+)
+_DELETE_DEVICE = delete(Device).where(Device.mac == _MAC).execution_options(**_NO_SYNC)
+_RESET_MANUFACTURER = (
+    update(Device)
+    .where(Device.mac == _MAC)
+    .values(manufacturer_status=ManufacturerStatus.PENDING, manufacturer_last_attempt=None)
+    .execution_options(**_NO_SYNC)
+)
+# Whether a manufacturer lookup should be started for a device
+_LOOKUP_DUE = or_(
+    # Added to an existing table before the column had a default
+    Device.manufacturer_status.is_(None),
+    # Never tried, reset for retry, or a stale claim / error older than 5 minutes
+    and_(
+        Device.manufacturer_status.in_([ManufacturerStatus.PENDING, ManufacturerStatus.ERROR]),
+        or_(
+            Device.manufacturer_last_attempt.is_(None),
+            Device.manufacturer_last_attempt < func.now() - text("INTERVAL 5 MINUTE")
+        )
+    ),
+    # Found but without actual data
+    and_(
+        Device.manufacturer_status == ManufacturerStatus.FOUND,
+        func.coalesce(Device.manufacturer, '') == ''
+    )
+)
+# The listing says which devices are due a lookup, so showing the list starts them
+_LIST_DEVICES = (
+    select(*DEVICE_COLUMNS, _LOOKUP_DUE.label("lookup_due"))
+    .order_by(Device.last_seen.desc())
+)
+_CLAIM_MANUFACTURER_LOOKUP = (
+    update(Device)
+    .where(Device.mac == _MAC, _LOOKUP_DUE)
+    .values(manufacturer_status=ManufacturerStatus.PENDING, manufacturer_last_attempt=func.now())
+    .execution_options(**_NO_SYNC)
+)
+_SET_MANUFACTURER = mysql_insert(Device).values(
+    mac=_MAC,
+    notify=False,
+    manufacturer=bindparam("manufacturer"),
+    manufacturer_status=bindparam("status"),
+    manufacturer_last_attempt=func.now()
+)
+_SET_MANUFACTURER = _SET_MANUFACTURER.on_duplicate_key_update(
+    manufacturer=_SET_MANUFACTURER.inserted.manufacturer,
+    manufacturer_status=_SET_MANUFACTURER.inserted.manufacturer_status,
+    manufacturer_last_attempt=func.now()
+)
+_GET_MANUFACTURER_STATES = select(
+    Device.mac, Device.manufacturer_display, Device.manufacturer_status, _LOOKUP_DUE
+).where(Device.mac.in_(_MACS))
+_GET_UNKNOWN_MACS = select(Device.mac).where(
+    Device.manufacturer_status == ManufacturerStatus.UNKNOWN
+)
+_RETRY_FAILED_MANUFACTURERS = (
+    update(Device)
+    .where(Device.manufacturer_status.in_([ManufacturerStatus.ERROR, ManufacturerStatus.UNKNOWN]))
+    .values(manufacturer_status=ManufacturerStatus.PENDING, manufacturer_last_attempt=None)
+    .execution_options(**_NO_SYNC)
+)
+_INSERT_CLAIMED_DEVICE = mysql_insert(Device).prefix_with("IGNORE").values(
+    mac=_MAC,
+    notify=False,
+    manufacturer_status=ManufacturerStatus.PENDING,
+    manufacturer_last_attempt=func.now()
+)
+
+# Cache miss marker where None is a valid cached value
+_MISSING = object()
+
+# Session shared by all database calls inside Database.session_scope()
+_session_ctx: ContextVar[Optional[AsyncSession]] = ContextVar("session", default=None)
+
+
+@lru_cache(maxsize=1)
+def _db_url() -> str:
+    """Build the database URL from the environment once per process."""
+    return (
+        f"mysql+asyncmy://{os.getenv('DB_USER', 'router_events')}:"
+        f"{os.getenv('DB_PASSWORD', '')}@{os.getenv('DB_HOST', 'localhost')}:"
+        f"{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'router_events')}"
+    )
+
+
+def _create_schema(conn):
+    """Create missing tables, then bring columns and indexes up to date with one ALTER per table."""
+    Base.metadata.create_all(conn)
+
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+
+        clauses = [
+            f"ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"
+            for column in table.columns if column.name not in columns
+        ] + [
+            f"ADD INDEX {index.name} ({', '.join(column.name for column in index.columns)})"
+            for index in table.indexes if index.name not in indexes
+        ] + [
+            f"DROP INDEX {name}"
+            for name in SUPERSEDED_INDEXES.get(table.name, ()) if name in indexes
+        ]
+        if clauses:
+            logger.info("Upgrading table %s: %s", table.name, ", ".join(clauses))
+            conn.execute(text(f"ALTER TABLE {table.name} {', '.join(clauses)}"))
+
+
+class Database:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """Async database operations for device tracking."""
 
     def __init__(self):
         self.engine = None
         self.session_factory = None
+        self.read_session_factory = None
+        self._device_queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._manufacturer_cache = TTLCache(MANUFACTURER_CACHE_SIZE, MANUFACTURER_CACHE_TTL)
+        # Devices whose lookup gave up stay unknown until a retry, so they are kept without expiry
+        self._unknown_macs: Set[str] = set()
+        self._manufacturer_loader = BatchLoader(self.get_manufacturer_states)
+        self._recent_devices = TTLCache(RECENT_DEVICES_SIZE, RECENT_DEVICES_TTL)
+        self._device_cache = TTLCache(DEVICE_CACHE_SIZE, DEVICE_CACHE_TTL)
+        self._device_loader = BatchLoader(self._load_devices)
 
     async def connect(self):
         """Connect to database and ensure schema exists."""
-        db_url = (
-            f"mysql+aiomysql://{os.getenv('DB_USER', 'router_events')}:"
-            f"{os.getenv('DB_PASSWORD', '')}@{os.getenv('DB_HOST', 'localhost')}:"
-            f"{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'router_events')}"
+        # Engine and pool check their logger level on every statement, keep it off INFO
+        logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
+        pool_size = int(os.getenv('DB_POOL_SIZE', '20'))
+        self.engine = create_async_engine(
+            _db_url(),
+            pool_size=pool_size,
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '10')),
+            pool_pre_ping=True,
+            pool_recycle=1800,
+            query_cache_size=1200,
+            hide_parameters=True
         )
-
-        self.engine = create_async_engine(db_url, echo=False)
-        self.session_factory = sessionmaker(
-            self.engine, class_=AsyncSession, expire_on_commit=False
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        # Reads outside session_scope() run in autocommit mode, skipping BEGIN/COMMIT
+        self.read_session_factory = async_sessionmaker(
+            self.engine.execution_options(isolation_level="AUTOCOMMIT"), expire_on_commit=False
         )
 
-        # Create tables if they don't exist
+        # Create or extend tables, one replica at a time
         async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+            result = await conn.execute(text(f"SELECT GET_LOCK('{SCHEMA_LOCK}', 30)"))
+            # 0 on timeout and NULL on error: never change the schema without the lock
+            if result.scalar() != 1:
+                raise RuntimeError(f"Could not acquire schema lock {SCHEMA_LOCK}")
+            try:
+                await conn.run_sync(_create_schema)
+            finally:
+                await conn.execute(text(f"SELECT RELEASE_LOCK('{SCHEMA_LOCK}')"))
 
-        # Test connection
-        async with self.session_factory() as session:
-            await session.execute(text("SELECT 1"))
+        # Open all pooled connections up front so early requests don't pay for connecting
+        await asyncio.gather(*(self._warm_connection() for _ in range(pool_size)))
+
+        async with self.engine.connect() as conn:
+            result = await conn.execute(_GET_UNKNOWN_MACS)
+            self._unknown_macs = {mac for mac, in result}
+
+        self._device_queue = asyncio.Queue()
+        self._flusher = asyncio.create_task(self._flush_devices())
 
         logger.info("Database connected")
 
+    async def _warm_connection(self):
+        """Check out a pooled connection and return it to the pool."""
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
     async def close(self):
         """Close database connection."""
+        if self._flusher:
+            # Sentinel makes the flusher write what is queued and stop
+            self._device_queue.put_nowait(None)
+            await self._flusher
+            self._flusher = None
         if self.engine:
             await self.engine.dispose()
 
-    async def add_device(self, mac: str, name: Optional[str] = None) -> Device:
-        """Add or update device."""
-        async with self.session_factory() as session:
-            device = await session.get(Device, mac)
+    @asynccontextmanager
+    async def session_scope(self) -> AsyncIterator[None]:
+        """Run all database calls in the block on one session and transaction."""
+        if _session_ctx.get() is not None:
+            yield
+            return
+
+        async with self.session_factory() as session, session.begin():
+            token = _session_ctx.set(session)
+            try:
+                yield
+            finally:
+                _session_ctx.reset(token)
+
+    @asynccontextmanager
+    async def _session(self, commit: bool = False) -> AsyncIterator[AsyncSession]:
+        """Get the scoped session, or a new one that is committed on exit if requested."""
+        session = _session_ctx.get()
+        if session is not None:
+            yield session
+            return
+
+        factory = self.session_factory if commit else self.read_session_factory
+        async with factory() as session:
+            yield session
+            if commit:
+                await session.commit()
+
+    async def add_device(self, mac: str, name: Optional[str] = None):
+        """Add device or refresh its last seen time, keeping an existing name."""
+        # Host names come from the router unchecked; strict mode would reject an overlong one
+        if name:
+            name = name[:NAME_LENGTH]
+        # Repeated events within a minute change nothing worth writing
+        if self._recent_devices.get(mac, _MISSING) == name:
+            return
 
-            if device:
-                device.last_seen = datetime.datetime.now()
-                if name and not device.name:
-                    device.name = name
+        if self._flusher is None:
+            await self.add_devices([(mac, name)])
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._device_queue.put_nowait((mac, name, future))
+            await future
+
+        self._recent_devices.set(mac, name)
+
+    async def upsert_device(self, mac: str, name: Optional[str] = None) -> Optional[Row]:
+        """Record a device event, returning the device as it was before or None if new."""
+        device = await self.get_device(mac)
+        await self.add_device(mac, name)
+        return device
+
+    async def _flush_devices(self):
+        """Write queued device upserts in batches until the sentinel arrives."""
+        while True:
+            batch = [await self._device_queue.get()]
+            while len(batch) < DEVICE_BATCH_SIZE and not self._device_queue.empty():
+                batch.append(self._device_queue.get_nowait())
+
+            items = [item for item in batch if item is not None]
+            if items:
+                await self._write_batch(items)
+            if len(items) < len(batch):
+                return
+
+    async def _write_batch(self, items: List[Tuple[str, Optional[str], asyncio.Future]]):
+        """Upsert a batch of queued devices and resolve their futures."""
+        rows = {}
+        for mac, name, _ in items:
+            if name or mac not in rows:
+                rows[mac] = name
+
+        try:
+            await self.add_devices(rows.items())
+            errors = {}
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if len(rows) == 1:
+                logger.error("Device batch write failed: %s", e)
+                errors = dict.fromkeys(rows, e)
+            else:
+                # One bad row must not fail the whole batch, so find it row by row
+                logger.warning("Device batch write failed, writing rows one at a time: %s", e)
+                errors = await self._write_rows(rows.items())
+
+        for mac, _, future in items:
+            if future.done():
+                continue
+            if mac in errors:
+                future.set_exception(errors[mac])
             else:
-                device = Device(
-                    mac=mac,
-                    name=name,
-                    notify=False,
-                    first_seen=datetime.datetime.now(),
-                    last_seen=datetime.datetime.now()
+                future.set_result(None)
+
+    async def _write_rows(self, rows: Iterable[Tuple[str, Optional[str]]]) -> Dict[str, Exception]:
+        """Upsert devices one at a time, returning the error of each row that failed."""
+        errors = {}
+        for mac, name in rows:
+            try:
+                await self.add_devices([(mac, name)])
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Device write failed for %s: %s", mac, e)
+                errors[mac] = e
+        return errors
+
+    async def add_devices(self, rows: Iterable[Tuple[str, Optional[str]]]):
+        """Add or refresh many (mac, name) devices with multi-row upserts."""
+        rows = list(rows)
+        async with self._session(commit=True) as session:
+            for start in range(0, len(rows), DEVICE_BATCH_SIZE):
+                stmt = mysql_insert(Device).values([
+                    {"mac": mac, "name": name, "notify": False}
+                    for mac, name in rows[start:start + DEVICE_BATCH_SIZE]
+                ])
+                # Inserts get first_seen/last_seen from the server defaults. ON UPDATE
+                # CURRENT_TIMESTAMP only fires when a column changes, so set it here.
+                stmt = stmt.on_duplicate_key_update(
+                    last_seen=func.now(),
+                    name=func.coalesce(Device.name, stmt.inserted.name)
                 )
-                session.add(device)
+                await session.execute(stmt)
+        for mac, _ in rows:
+            self._device_cache.pop(mac)
+
+    async def get_devices(self) -> List[Row]:
+        """Get all devices with their lookup_due flag, most recently seen first."""
+        async with self._session() as session:
+            result = await session.execute(_LIST_DEVICES)
+            return list(result.all())
+
+    async def iter_device_batches(self) -> AsyncIterator[Sequence[Row]]:
+        """Stream all devices, most recently seen first, in batches of rows."""
+        # Own session: a stream holds its connection until iteration finishes
+        async with self.read_session_factory() as session:
+            result = await session.stream(
+                _LIST_DEVICES, execution_options={"yield_per": DEVICE_STREAM_BATCH}
+            )
+            async for rows in result.partitions():
+                yield rows
 
-            await session.commit()
+    async def get_device(self, mac: str) -> Optional[Row]:
+        """Get device by MAC as a row of the listed columns."""
+        device = self._device_cache.get(mac, _MISSING)
+        if device is not _MISSING:
             return device
 
-    async def get_devices(self) -> List[Device]:
-        """Get all devices."""
-        async with self.session_factory() as session:
-            result = await session.execute(select(Device))
-            return list(result.scalars().all())
-
-    async def get_device(self, mac: str) -> Optional[Device]:
-        """Get device by MAC."""
-        async with self.session_factory() as session:
-            return await session.get(Device, mac)
+        # Concurrent callers share one IN query
+        return await self._device_loader.load(mac)
+
+    async def _load_devices(self, macs: Sequence[str]) -> Dict[str, Row]:
+        """Get devices for many MACs in bulk, caching missing devices as None."""
+        devices = await self.get_devices_by_macs(macs)
+        for mac in macs:
+            self._device_cache.set(mac, devices.get(mac))
+        return devices
+
+    async def get_devices_by_macs(self, macs: Sequence[str]) -> Dict[str, Row]:
+        """Get devices for many MACs in bulk, keyed by MAC."""
+        devices = {}
+        async with self._session() as session:
+            for start in range(0, len(macs), IN_CHUNK_SIZE):
+                result = await session.execute(
+                    _GET_DEVICES, {"macs": macs[start:start + IN_CHUNK_SIZE]}
+                )
+                devices.update((device.mac, device) for device in result)
+        return devices
 
     async def set_device_name(self, mac: str, name: Optional[str]):
         """Update device name."""
-        async with self.session_factory() as session:
-            await session.execute(update(Device).where(Device.mac == mac).values(name=name))
-            await session.commit()
+        async with self._session(commit=True) as session:
+            await session.execute(_SET_NAME, {"mac": mac, "name": name})
+        self._device_cache.pop(mac)
 
     async def set_device_notify(self, mac: str, notify: bool):
         """Update device notification setting."""
-        async with self.session_factory() as session:
-            await session.execute(update(Device).where(Device.mac == mac).values(notify=notify))
-            await session.commit()
+        async with self._session(commit=True) as session:
+            await session.execute(_SET_NOTIFY, {"mac": mac, "notify": notify})
+        self._device_cache.pop(mac)
 
     async def delete_device(self, mac: str):
         """Delete device by MAC address."""
-        async with self.session_factory() as session:
-            device = await session.get(Device, mac)
-            if device:
-                await session.delete(device)
-                await session.commit()
+        async with self._session(commit=True) as session:
+            await session.execute(_DELETE_DEVICE, {"mac": mac})
+        self._forget_manufacturer(mac)
+        self._device_cache.pop(mac)
+        self._recent_devices.pop(mac)
 
     async def get_manufacturer(self, mac: str) -> Optional[str]:
         """Get cached manufacturer."""
-        async with self.session_factory() as session:
-            result = await session.execute(
-                select(Device.manufacturer, Device.manufacturer_status).where(Device.mac == mac)
-            )
-            row = result.first()
-
-            if not row:
-                return None
-
-            manufacturer, status = row
-            if status == ManufacturerStatus.FOUND and manufacturer:
-                return manufacturer
-            if status in (ManufacturerStatus.UNKNOWN, ManufacturerStatus.ERROR):
-                return 'Unknown'
-            return None  # Pending status
-
-    async def needs_manufacturer_lookup(self, mac: str) -> bool:
-        """Check if manufacturer lookup is needed."""
-        async with self.session_factory() as session:
-            result = await session.execute(
-                select(Device.manufacturer_status, Device.manufacturer_last_attempt,
-                       Device.manufacturer)
-                .where(Device.mac == mac)
-            )
-            row = result.first()
+        manufacturer, _ = await self.get_manufacturer_state(mac)
+        return manufacturer
+
+    async def get_manufacturer_state(self, mac: str) -> Tuple[Optional[str], bool]:
+        """Get displayed manufacturer and whether a lookup is due, in one query."""
+        manufacturer = self._cached_manufacturer(mac)
+        if manufacturer is not None:
+            return manufacturer, False
+
+        # Concurrent callers share one IN query
+        return await self._manufacturer_loader.load(mac)
+
+    async def get_manufacturers(self, macs: Sequence[str]) -> Dict[str, Optional[str]]:
+        """Get cached manufacturers for many MACs, querying the misses in bulk."""
+        states = await self.get_manufacturer_states(macs)
+        return {mac: manufacturer for mac, (manufacturer, _) in states.items()}
+
+    async def get_manufacturer_states(
+            self, macs: Sequence[str]) -> Dict[str, Tuple[Optional[str], bool]]:
+        """Get manufacturer states for many MACs, querying the cache misses in bulk."""
+        states = {}
+        missing = []
+        for mac in macs:
+            manufacturer = self._cached_manufacturer(mac)
+            if manufacturer is None:
+                # Unknown devices get a lookup
+                states[mac] = (None, True)
+                missing.append(mac)
+            else:
+                states[mac] = (manufacturer, False)
 
-            if not row:
+        async with self._session() as session:
+            for start in range(0, len(missing), IN_CHUNK_SIZE):
+                result = await session.execute(
+                    _GET_MANUFACTURER_STATES, {"macs": missing[start:start + IN_CHUNK_SIZE]}
+                )
+                for mac, manufacturer, status, due in result:
+                    states[mac] = (self._cache_manufacturer(mac, manufacturer, status), bool(due))
+
+        return states
+
+    def _cached_manufacturer(self, mac: str) -> Optional[str]:
+        """Get displayed manufacturer from memory, or None if not cached."""
+        if mac in self._unknown_macs:
+            return 'Unknown'
+        return self._manufacturer_cache.get(mac)
+
+    def _forget_manufacturer(self, mac: str):
+        """Drop in-memory manufacturer state for a device."""
+        self._manufacturer_cache.pop(mac)
+        self._unknown_macs.discard(mac)
+
+    def _cache_manufacturer(self, mac: str, manufacturer: Optional[str],
+                            status: ManufacturerStatus) -> Optional[str]:
+        """Cache displayed manufacturer if its lookup state is final."""
+        if status == ManufacturerStatus.UNKNOWN:
+            self._unknown_macs.add(mac)
+        elif manufacturer is not None and status.is_final():
+            self._manufacturer_cache.set(mac, manufacturer)
+        return manufacturer
+
+    async def claim_manufacturer_lookup(self, mac: str) -> bool:
+        """Mark device as pending lookup if one is due, returning whether it was claimed."""
+        async with self._session(commit=True) as session:
+            result = await session.execute(_CLAIM_MANUFACTURER_LOOKUP, {"mac": mac})
+            if result.rowcount:
                 return True
 
-            status, last_attempt, manufacturer = row
-
-            # If we have a successful lookup with actual data, no need to retry
-            if status == ManufacturerStatus.FOUND and manufacturer:
-                return False
-
-            # If marked as unknown, no need to retry
-            if status == ManufacturerStatus.UNKNOWN:
-                return False
-
-            # Retry errors after 5 minutes
-            if status == ManufacturerStatus.ERROR and last_attempt:
-                return (datetime.datetime.now() - last_attempt).total_seconds() > 300
-
-            # Need lookup for pending, error, or found-but-empty
-            return True
+            # Unknown device, claimed only if this call creates it
+            result = await session.execute(_INSERT_CLAIMED_DEVICE, {"mac": mac})
+            return result.rowcount == 1
 
     async def set_manufacturer(self, mac: str, manufacturer: Optional[str], status: str = 'found'):
         """Set manufacturer info."""
@@ -158,48 +520,30 @@ class Database:
             logger.error("Invalid status: %s", status)
             return
 
-        async with self.session_factory() as session:
-            # Get or create device
-            device = await session.get(Device, mac)
-            if not device:
-                device = Device(mac=mac)
-                session.add(device)
-
-            # Update manufacturer info
-            device.manufacturer = manufacturer
-            device.manufacturer_status = status_enum
-            device.manufacturer_last_attempt = datetime.datetime.now()
-
-            await session.commit()
+        async with self._session(commit=True) as session:
+            await session.execute(
+                _SET_MANUFACTURER,
+                {"mac": mac, "manufacturer": manufacturer, "status": status_enum}
+            )
+        self._forget_manufacturer(mac)
+        if status_enum == ManufacturerStatus.UNKNOWN:
+            self._unknown_macs.add(mac)
+        self._device_cache.pop(mac)
 
     async def retry_failed_manufacturer_lookups(self) -> int:
         """Reset all failed and unknown manufacturer lookups for retry."""
-        async with self.session_factory() as session:
-            result = await session.execute(
-                update(Device)
-                .where(Device.manufacturer_status.in_([
-                    ManufacturerStatus.ERROR, ManufacturerStatus.UNKNOWN
-                ]))
-                .values(
-                    manufacturer_status=ManufacturerStatus.PENDING,
-                    manufacturer_last_attempt=None
-                )
-            )
-            await session.commit()
-            return result.rowcount
+        async with self._session(commit=True) as session:
+            result = await session.execute(_RETRY_FAILED_MANUFACTURERS)
+        self._manufacturer_cache.clear()
+        self._unknown_macs.clear()
+        return result.rowcount
 
     async def reset_manufacturer_lookup(self, mac: str):
         """Reset manufacturer lookup for specific device."""
-        async with self.session_factory() as session:
-            await session.execute(
-                update(Device)
-                .where(Device.mac == mac)
-                .values(
-                    manufacturer_status=ManufacturerStatus.PENDING,
-                    manufacturer_last_attempt=None
-                )
-            )
-            await session.commit()
+        async with self._session(commit=True) as session:
+            await session.execute(_RESET_MANUFACTURER, {"mac": mac})
+        self._forget_manufacturer(mac)
+        self._device_cache.pop(mac)
 
 
 db = Database()
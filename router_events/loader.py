@@ -0,0 +1,52 @@
+"""Coalescing of concurrent single-key reads into bulk reads."""
+
+import asyncio
+import contextvars
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class BatchLoader:  # pylint: disable=too-few-public-methods
+    """Collect keys requested in one event loop tick and load them with one bulk call."""
+
+    def __init__(self, load_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]):
+        self.load_many = load_many
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        # The loop only keeps weak references to tasks, so running bulk calls are held here
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, key: Hashable) -> Any:
+        """Load value for key, sharing one bulk call with other keys requested meanwhile."""
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                # Empty context: the bulk call must not join a caller's scoped session
+                loop.call_soon(self._dispatch, context=contextvars.Context())
+            future = loop.create_future()
+            self._pending[key] = future
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        """Start the bulk call for all keys collected so far."""
+        pending, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._run(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pending: Dict[Hashable, asyncio.Future]):
+        """Run the bulk call and resolve the futures of its keys."""
+        try:
+            values = await self.load_many(list(pending))
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error("Batch load failed: %s", e)
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in pending.items():
+            if not future.done():
+                future.set_result(values.get(key))
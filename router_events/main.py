@@ -1,131 +1,191 @@
 """Main FastAPI application for RouterOS event processing."""
 
 import asyncio
-import time
 import logging
+import random
 from contextlib import asynccontextmanager
-from typing import Set
+from functools import lru_cache
+from typing import List, Optional, Set
+from urllib.parse import urlsplit
 
 import uvicorn
 import httpx
-from fastapi import FastAPI, Request, Response, HTTPException, BackgroundTasks
-from fastapi.responses import RedirectResponse, FileResponse
+import orjson
+from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi.responses import RedirectResponse, StreamingResponse
 
 from .database import db
 from .notifications import notifier
-from .schemas import DeviceUpdateRequest, UpdateResponse
+from .ratelimit import TokenBucket
+from .schemas import DeviceResponse, DeviceUpdateRequest, UpdateResponse
 
 logger = logging.getLogger(__name__)
 
 
-class RateLimiter:  # pylint: disable=too-few-public-methods
-    """Simple rate limiter for API requests."""
-
-    def __init__(self, interval: float = 0.5):
-        self.interval = interval
-        self.last_request = 0.0
-
-    async def wait_if_needed(self):
-        """Wait if rate limit requires it."""
-        elapsed = time.time() - self.last_request
-        if elapsed < self.interval:
-            await asyncio.sleep(self.interval - elapsed)
-        self.last_request = time.time()
+class LookupWorker:
+    """Looks up queued manufacturers with a few worker tasks, within a shared rate limit."""
+
+    def __init__(self, rate: float = 2.0, burst: int = 2, workers: int = 2, maxsize: int = 1024):
+        self.limiter = TokenBucket(rate, burst)
+        self.workers = workers
+        self.maxsize = maxsize
+        self.pending: Set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, client: httpx.AsyncClient):
+        """Start the worker tasks, making API requests with the given client."""
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._run(client)) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the worker tasks, dropping queued lookups."""
+        # Unfinished claims become due again after five minutes
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.pending.clear()
+
+    def enqueue(self, mac: str):
+        """Queue a lookup unless one is already queued or running for the MAC."""
+        if self._queue is None or mac in self.pending:
+            return
+        try:
+            self._queue.put_nowait(mac)
+        except asyncio.QueueFull:
+            # Still due, so the next request for the MAC queues it again
+            logger.warning("Lookup queue full, skipping %s", mac)
+            return
+        self.pending.add(mac)
+
+    async def _run(self, client: httpx.AsyncClient):
+        """Claim and look up queued MACs until cancelled."""
+        while True:
+            mac = await self._queue.get()
+            try:
+                # Atomically marks the device pending, so only one lookup runs per MAC
+                if not await db.claim_manufacturer_lookup(mac):
+                    continue
+
+                await lookup_manufacturer(mac, client, self.limiter)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Manufacturer lookup failed for %s: %s", mac, e)
+            finally:
+                self.pending.discard(mac)
 
 
 # Global state
-rate_limiter = RateLimiter()
-pending_lookups: Set[str] = set()
+lookup_worker = LookupWorker()
+
+# Connection limits of the HTTP client shared by all manufacturer lookups
+HTTP_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5)
+
+# Attempts per API before moving on, the delay between them doubling from the base
+LOOKUP_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0
+
+
+async def _get_with_backoff(client: httpx.AsyncClient, url: str,
+                            limiter: TokenBucket) -> Optional[httpx.Response]:
+    """GET url, retrying throttled and failed requests with backoff, None if all attempts fail."""
+    throttled = False
+    for attempt in range(LOOKUP_ATTEMPTS):
+        if attempt:
+            delay = RETRY_BASE_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            if throttled:
+                # Throttling applies to every worker, so the shared bucket holds them all back
+                limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+        # Every request takes a token, retries included, so the rate limit holds per request
+        await limiter.acquire()
+        try:
+            response = await client.get(url)
+        except httpx.RequestError as e:
+            logger.debug("Request to %s failed: %s", url, e)
+            throttled = False
+            continue
+
+        throttled = response.status_code == 429
+        if not throttled and response.status_code < 500:
+            return response
+        logger.debug("Request to %s returned %s", url, response.status_code)
+    return None
+
+
+async def lookup_manufacturer(mac: str, client: httpx.AsyncClient, limiter: TokenBucket):
+    """Look up manufacturer with multiple APIs and store the result."""
+    # Try multiple APIs in order
+    apis = [
+        f"https://api.macvendors.com/{mac}",
+        f"https://maclookup.app/api/v2/macs/{mac}",
+        f"https://api.maclookup.app/v2/macs/{mac}/company/name"
+    ]
+
+    answered = False
+    for api_url in apis:
+        response = await _get_with_backoff(client, api_url, limiter)
+        if response is None:
+            continue  # Try next API
+
+        answered = True
+        if response.status_code == 200:
+            manufacturer = await _parse_manufacturer_response(response, api_url)
+
+            if (manufacturer and "Not Found" not in manufacturer
+                and "error" not in manufacturer.lower()):
+                await db.set_manufacturer(mac, manufacturer, 'found')
+                logger.info("Found manufacturer for %s: %s (via %s)",
+                          mac, manufacturer, api_url)
+                return
+
+    if answered:
+        # At least one API had no data for the MAC
+        await db.set_manufacturer(mac, 'Unknown', 'unknown')
+    else:
+        await db.set_manufacturer(mac, None, 'error')
+        logger.error("Manufacturer lookup failed for %s: no API available", mac)
 
 
-async def lookup_manufacturer(mac: str):
-    """Background manufacturer lookup with rate limiting and multiple APIs."""
-    if mac in pending_lookups:
-        return
+def _parse_text(response) -> str:
+    """Parse plain text manufacturer response."""
+    return response.text.strip()
 
-    if not await db.needs_manufacturer_lookup(mac):
-        return
 
-    pending_lookups.add(mac)
+def _parse_maclookup_json(response) -> str:
+    """Parse JSON manufacturer response from maclookup.app."""
     try:
-        # Set status to pending to prevent duplicate lookups
-        await db.set_manufacturer(mac, None, 'pending')
-        await rate_limiter.wait_if_needed()
-
-        # Try multiple APIs in order
-        apis = [
-            f"https://api.macvendors.com/{mac}",
-            f"https://maclookup.app/api/v2/macs/{mac}",
-            f"https://api.maclookup.app/v2/macs/{mac}/company/name"
-        ]
-
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            for api_url in apis:
-                try:
-                    response = await client.get(api_url)
-
-                    if response.status_code == 200:
-                        manufacturer = await _parse_manufacturer_response(response, api_url)
-
-                        if (manufacturer and "Not Found" not in manufacturer
-                            and "error" not in manufacturer.lower()):
-                            await db.set_manufacturer(mac, manufacturer, 'found')
-                            logger.info("Found manufacturer for %s: %s (via %s)",
-                                      mac, manufacturer, api_url)
-                            return
-
-                except (httpx.RequestError, httpx.TimeoutException):
-                    continue  # Try next API
-
-            # All APIs failed or returned no data
-            await db.set_manufacturer(mac, 'Unknown', 'unknown')
-
-    except (httpx.RequestError, httpx.TimeoutException) as e:
-        await db.set_manufacturer(mac, None, 'error')
-        logger.error("Manufacturer lookup failed for %s: %s", mac, e)
-    finally:
-        pending_lookups.discard(mac)
+        data = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return response.text.strip()
+    if isinstance(data, dict):
+        return data.get('company') or data.get('companyName') or ""
+    return response.text.strip()
 
 
-async def _parse_manufacturer_response(response, api_url: str) -> str:
-    """Parse manufacturer response based on API type."""
-    if "maclookup.app" in api_url:
-        # Handle JSON response from maclookup.app
-        try:
-            data = response.json()
-            if isinstance(data, dict):
-                return data.get('company') or data.get('companyName') or ""
-            return response.text.strip()
-        except (ValueError, TypeError):
-            return response.text.strip()
-    else:
-        # Handle plain text response
-        return response.text.strip()
+# Response parser per API host, all other APIs answer in plain text
+RESPONSE_PARSERS = {"maclookup.app": _parse_maclookup_json}
 
 
-def get_device_attr(device, attr: str, default=None):
-    """Get attribute from device (handles both dict and object)."""
-    if hasattr(device, attr):
-        return getattr(device, attr, default)
-    return device.get(attr, default) if hasattr(device, 'get') else default
+async def _parse_manufacturer_response(response, api_url: str) -> str:
+    """Parse manufacturer response based on API type."""
+    parser = RESPONSE_PARSERS.get(urlsplit(api_url).netloc, _parse_text)
+    return parser(response)
 
 
 async def process_device_event(mac: str, ip: str, host: str):
     """Process device assignment event."""
-    device = await db.get_device(mac)
+    # An existing name is kept by the upsert, so the host name only fills in a missing one
+    device = await db.upsert_device(mac, host or None)
 
     if not device:
-        await db.add_device(mac, host or None)
         await notifier.notify_unknown_device(mac, ip, host)
         logger.info("New device: %s (%s) -> %s", mac, host or 'unknown', ip)
-    else:
-        device_name = get_device_attr(device, 'name')
-        await db.add_device(mac, host or device_name)
-
-        if get_device_attr(device, 'notify', False):
-            name = device_name or host or 'Unknown'
-            await notifier.notify_tracked_device(name, mac, ip)
-            logger.info("Tracked device: %s -> %s", name, ip)
+    elif device.notify:
+        name = device.name or host or 'Unknown'
+        await notifier.notify_tracked_device(name, mac, ip)
+        logger.info("Tracked device: %s -> %s", name, ip)
 
 
 @asynccontextmanager
@@ -133,7 +193,12 @@ async def lifespan(_app: FastAPI):
     """Application lifecycle management."""
     logger.info("Starting RouterOS Event Receiver")
     await db.connect()
-    yield
+    # One client for the app's lifetime keeps TLS connections to the lookup APIs open
+    async with httpx.AsyncClient(http2=True, timeout=5.0, limits=HTTP_LIMITS) as client:
+        lookup_worker.start(client)
+        yield
+        await lookup_worker.stop()
+    await notifier.close()
     await db.close()
     logger.info("Application stopped")
 
@@ -152,10 +217,17 @@ async def root():
     return RedirectResponse(url="/devices.html")
 
 
+@lru_cache(maxsize=1)
+def _devices_html() -> bytes:
+    """Read the devices page once, it only changes with a new deployment."""
+    with open("static/devices.html", "rb") as f:
+        return f.read()
+
+
 @app.get("/devices.html")
 async def devices_page():
     """Serve devices HTML page."""
-    return FileResponse("static/devices.html")
+    return Response(_devices_html(), media_type="text/html")
 
 
 @app.post("/api/events")
@@ -165,13 +237,21 @@ async def receive_event(request: Request):
         if not request.headers.get("content-type", "").startswith("application/json"):
             return Response(status_code=204)
 
-        data = await request.json()
-        if data.get('action') == 'assigned' and data.get('mac'):
-            await process_device_event(
-                data['mac'],
-                data.get('ip', ''),
-                (data.get('host') or '').strip()
-            )
+        data = orjson.loads(await request.body())
+        events = data if isinstance(data, list) else [data]
+        # Events for one MAC are merged: run concurrently, they would all see the device as
+        # it was before the request and notify once each. Keep the latest IP and host name.
+        assigned = {}
+        for event in events:
+            if event.get('action') == 'assigned' and event.get('mac'):
+                _, previous_host = assigned.get(event['mac'], ('', ''))
+                host = (event.get('host') or '').strip() or previous_host
+                assigned[event['mac']] = (event.get('ip', ''), host)
+
+        # Distinct devices are processed concurrently, so their reads and writes are batched
+        await asyncio.gather(*(
+            process_device_event(mac, ip, host) for mac, (ip, host) in assigned.items()
+        ))
 
     except Exception as e:  # pylint: disable=broad-exception-caught
         logger.error("Event processing error: %s", e)
@@ -179,50 +259,59 @@ async def receive_event(request: Request):
     return Response(status_code=204)
 
 
+def device_to_dict(device) -> dict:
+    """Convert device row to API response dict."""
+    return {
+        "mac": device.mac,
+        "name": device.name,
+        "notify": device.notify,
+        "manufacturer": device.manufacturer,
+        "first_seen": device.first_seen,
+        "last_seen": device.last_seen
+    }
+
+
+async def _stream_devices():
+    """Encode the device list as JSON while rows stream from the database."""
+    yield b'{"devices": ['
+    separator = b''
+    async for devices in db.iter_device_batches():
+        for device in devices:
+            if device.lookup_due:
+                # The page only loads this listing, so it starts new and retried lookups
+                lookup_worker.enqueue(device.mac)
+        yield separator + b','.join(orjson.dumps(device_to_dict(device)) for device in devices)
+        separator = b','
+    yield b']}'
+
+
 @app.get("/api/devices")
 async def get_devices():
     """Get all devices."""
-    devices = await db.get_devices()
-    return {"devices": [
-        {
-            "mac": d.mac,
-            "name": d.name,
-            "notify": d.notify,
-            "manufacturer": d.manufacturer,
-            "first_seen": d.first_seen,
-            "last_seen": d.last_seen
-        }
-        for d in devices
-    ]}
-
-
-@app.get("/api/devices/{mac}")
+    return StreamingResponse(_stream_devices(), media_type="application/json")
+
+
+@app.get("/api/devices/{mac}", response_model=DeviceResponse)
 async def get_device(mac: str):
     """Get device by MAC address."""
     device = await db.get_device(mac)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
 
-    return {
-        "mac": device.mac,
-        "name": device.name,
-        "notify": device.notify,
-        "manufacturer": device.manufacturer,
-        "first_seen": device.first_seen,
-        "last_seen": device.last_seen
-    }
+    return device
 
 
 @app.put("/api/devices/{mac}")
 async def update_device(mac: str, update: DeviceUpdateRequest):
     """Update device settings."""
-    if not await db.get_device(mac):
-        await db.add_device(mac, update.name)
+    async with db.session_scope():
+        if not await db.get_device(mac):
+            await db.add_device(mac, update.name)
 
-    if update.name is not None:
-        await db.set_device_name(mac, update.name)
-    if update.notify is not None:
-        await db.set_device_notify(mac, update.notify)
+        if update.name is not None:
+            await db.set_device_name(mac, update.name)
+        if update.notify is not None:
+            await db.set_device_notify(mac, update.notify)
 
     return UpdateResponse(status="updated")
 
@@ -230,22 +319,23 @@ async def update_device(mac: str, update: DeviceUpdateRequest):
 @app.delete("/api/devices/{mac}")
 async def delete_device(mac: str):
     """Delete device by MAC address."""
-    if not await db.get_device(mac):
-        raise HTTPException(status_code=404, detail="Device not found")
+    async with db.session_scope():
+        if not await db.get_device(mac):
+            raise HTTPException(status_code=404, detail="Device not found")
 
-    await db.delete_device(mac)
+        await db.delete_device(mac)
     return {"status": "deleted"}
 
 
 @app.get("/api/manufacturer/{mac}")
-async def get_manufacturer(mac: str, background_tasks: BackgroundTasks):
+async def get_manufacturer(mac: str):
     """Get manufacturer for MAC address."""
-    manufacturer = await db.get_manufacturer(mac)
+    manufacturer, lookup_due = await db.get_manufacturer_state(mac)
     if manufacturer:
         return {"manufacturer": manufacturer}
 
-    if await db.needs_manufacturer_lookup(mac) and mac not in pending_lookups:
-        background_tasks.add_task(lookup_manufacturer, mac)
+    if lookup_due:
+        lookup_worker.enqueue(mac)
 
     return {"manufacturer": "Loading..."}
 
@@ -258,10 +348,10 @@ async def retry_failed_lookups():
 
 
 @app.post("/api/manufacturer/{mac}/retry")
-async def retry_manufacturer_lookup(mac: str, background_tasks: BackgroundTasks):
+async def retry_manufacturer_lookup(mac: str):
     """Force retry of manufacturer lookup for specific device."""
     await db.reset_manufacturer_lookup(mac)
-    background_tasks.add_task(lookup_manufacturer, mac)
+    lookup_worker.enqueue(mac)
     return {"message": f"Manufacturer lookup reset for {mac}"}
 
 
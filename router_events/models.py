@@ -1,7 +1,9 @@
 """Database models for device tracking."""
 
 from enum import Enum
-from sqlalchemy import Column, String, Boolean, DateTime, Enum as SQLEnum, text
+from sqlalchemy import (
+    Column, String, Boolean, DateTime, Enum as SQLEnum, Index, Computed, text
+)
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -29,15 +31,37 @@ class Device(Base):
     manufacturer = Column(String(255), nullable=True)
     manufacturer_status = Column(
         SQLEnum(ManufacturerStatus, values_callable=lambda obj: [e.value for e in obj]),
-        default=ManufacturerStatus.PENDING
+        default=ManufacturerStatus.PENDING,
+        # Also fills in existing rows when the column is added to an old table
+        server_default=ManufacturerStatus.PENDING.value
     )
     manufacturer_last_attempt = Column(DateTime, nullable=True)
+    # Manufacturer to show: the name when found, 'Unknown' when the lookup gave up
+    manufacturer_display = Column(
+        String(255),
+        Computed(
+            "CASE WHEN manufacturer_status = 'found' AND manufacturer <> '' THEN manufacturer "
+            "WHEN manufacturer_status IN ('unknown', 'error') THEN 'Unknown' END",
+            persisted=False
+        )
+    )
     first_seen = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
     last_seen = Column(
         DateTime,
         server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP')
     )
 
+    __table_args__ = (
+        # Serves scans for devices that still need a manufacturer lookup
+        Index('idx_mfr_status_attempt', 'manufacturer_status', 'manufacturer_last_attempt'),
+        # Covers the device listing and its lookup check, read newest first without a filesort
+        # (mac comes from the PK)
+        Index(
+            'idx_device_listing_due', 'last_seen', 'name', 'notify', 'first_seen', 'manufacturer',
+            'manufacturer_status', 'manufacturer_last_attempt'
+        ),
+    )
+
     def __repr__(self):
         return f"<Device(mac='{self.mac}', name='{self.name}')>"
 
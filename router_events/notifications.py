@@ -16,7 +16,14 @@ class NotificationService:
         self.url = os.getenv('NTFY_URL', 'https://ntfy.sh')
         self.topic = os.getenv('NTFY_TOPIC', 'router-events')
         self.token = os.getenv('NTFY_TOKEN')
-        self.enabled = os.getenv('NTFY_ENABLED', 'true').lower() == 'true'
+        self.enabled = os.getenv('NTFY_ENABLED', 'true').lower() in {'true', '1', 'yes'}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def close(self):
+        """Close the HTTP client, if one was opened."""
+        if self._client:
+            await self._client.aclose()
+            self._client = None
 
     async def send(self, title: str, message: str, priority: str = "default"):
         """Send notification."""
@@ -27,15 +34,18 @@ class NotificationService:
         if self.token:
             headers["Authorization"] = f"Bearer {self.token}"
 
+        if self._client is None:
+            # Kept open between notifications so the ntfy connection is reused
+            self._client = httpx.AsyncClient(timeout=10.0)
+
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    f"{self.url}/{self.topic}",
-                    data=message,
-                    headers=headers
-                )
-                response.raise_for_status()
-                logger.info("Notification sent: %s", title)
+            response = await self._client.post(
+                f"{self.url}/{self.topic}",
+                data=message,
+                headers=headers
+            )
+            response.raise_for_status()
+            logger.info("Notification sent: %s", title)
         except (httpx.RequestError, httpx.HTTPStatusError) as e:
             logger.error("Notification failed '%s': %s", title, e)
 
@@ -0,0 +1,37 @@
+"""Rate limiting for outgoing API requests."""
+
+import asyncio
+import time
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """Allow bursts of up to capacity acquisitions, refilled at a steady rate per second."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Add the tokens accrued since the last refill."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Take a token, waiting for one to accrue if the bucket is empty."""
+        async with self._lock:
+            self._refill()
+            # Looped, since a pause during the wait pushes the next token further out
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def pause(self, seconds: float):
+        """Hold back all acquisitions for at least the given seconds, e.g. when throttled."""
+        self._refill()
+        # Owing tokens makes acquire() wait out the pause before the next one accrues
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
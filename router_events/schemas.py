@@ -1,9 +1,13 @@
 """API request/response models."""
 
+import re
 from datetime import datetime
 from typing import Optional, List
 from pydantic import BaseModel, Field, field_validator, ConfigDict
 
+# Six hex octets, all separated by the same ':' or '-'
+MAC_PATTERN = re.compile(r'[0-9A-Fa-f]{2}([:-])(?:[0-9A-Fa-f]{2}\1){4}[0-9A-Fa-f]{2}')
+
 
 class EventRequest(BaseModel):
     """RouterOS event request."""
@@ -16,7 +20,7 @@ class EventRequest(BaseModel):
     @classmethod
     def validate_mac(cls, v):
         """Validate MAC address format."""
-        if len(v) != 17 or (v.count(':') != 5 and v.count('-') != 5):
+        if not MAC_PATTERN.fullmatch(v):
             raise ValueError('Invalid MAC address format')
         return v.lower()
 
@@ -28,6 +32,7 @@ class DeviceResponse(BaseModel):
     mac: str
     name: Optional[str] = None
     notify: bool = False
+    manufacturer: Optional[str] = None
     first_seen: datetime
     last_seen: datetime
 
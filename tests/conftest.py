@@ -1,10 +1,19 @@
 """Test configuration and fixtures."""
 
 import pytest
+from unittest.mock import AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 from router_events.main import app
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def client():
-    """Create a test client for the FastAPI app."""
+    """Create a test client for the FastAPI app, shared by all tests."""
     return TestClient(app)
+
+
+@pytest.fixture
+def mock_limiter():
+    """Mock rate limiter that never waits."""
+    limiter = MagicMock()
+    limiter.acquire = AsyncMock()
+    return limiter
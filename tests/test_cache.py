@@ -0,0 +1,54 @@
+"""Tests for in-process caches."""
+
+from unittest.mock import patch
+
+from router_events.cache import TTLCache
+
+
+class TestTTLCache:
+    """Test TTLCache class."""
+
+    def test_get_set(self):
+        """Test storing and reading values."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("b", "default") == "default"
+
+    @patch('router_events.cache.time')
+    def test_expiry(self, mock_time):
+        """Test entries expire after the TTL."""
+        mock_time.monotonic.return_value = 100.0
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        
+        mock_time.monotonic.return_value = 159.0
+        assert cache.get("a") == 1
+        
+        mock_time.monotonic.return_value = 160.0
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """Test least recently used entry is evicted when full."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_pop_and_clear(self):
+        """Test removing entries."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        
+        assert cache.pop("a") == 1
+        assert cache.pop("a") is None
+        cache.clear()
+        assert len(cache) == 0
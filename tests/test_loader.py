@@ -0,0 +1,87 @@
+"""Tests for batched reads."""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from router_events.database import _session_ctx
+from router_events.loader import BatchLoader
+
+
+class TestBatchLoader:
+    """Test BatchLoader class."""
+
+    @pytest.mark.asyncio
+    async def test_load_batches_keys(self):
+        """Test keys requested together are loaded with one call."""
+        load_many = AsyncMock(return_value={"a": 1, "b": 2})
+        loader = BatchLoader(load_many)
+        
+        results = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"))
+        
+        assert results == [1, 2, 1]
+        load_many.assert_called_once_with(["a", "b"])
+
+    @pytest.mark.asyncio
+    async def test_load_missing_key(self):
+        """Test keys absent from the bulk result load as None."""
+        loader = BatchLoader(AsyncMock(return_value={}))
+        
+        assert await loader.load("a") is None
+
+    @pytest.mark.asyncio
+    async def test_load_keeps_running_task(self):
+        """Test the bulk call task is referenced until it finishes."""
+        started = asyncio.Event()
+        release = asyncio.Event()
+        
+        async def load_many(keys):
+            started.set()
+            await release.wait()
+            return {"a": 1}
+        loader = BatchLoader(load_many)
+        
+        load = asyncio.ensure_future(loader.load("a"))
+        await started.wait()
+        assert len(loader._tasks) == 1
+        
+        release.set()
+        assert await load == 1
+        await asyncio.sleep(0)
+        assert not loader._tasks
+
+    @pytest.mark.asyncio
+    async def test_load_separate_batches(self):
+        """Test keys requested after a batch started go into the next batch."""
+        load_many = AsyncMock(side_effect=[{"a": 1}, {"a": 3}])
+        loader = BatchLoader(load_many)
+        
+        assert await loader.load("a") == 1
+        assert await loader.load("a") == 3
+        assert load_many.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_load_error(self):
+        """Test a failed bulk call is raised to every caller."""
+        loader = BatchLoader(AsyncMock(side_effect=ValueError("boom")))
+        
+        results = await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+        
+        assert [str(result) for result in results] == ["boom", "boom"]
+
+    @pytest.mark.asyncio
+    async def test_load_outside_caller_context(self):
+        """Test the bulk call does not see context variables of its callers."""
+        seen = []
+        
+        async def load_many(keys):
+            seen.append(_session_ctx.get())
+            return {}
+        
+        token = _session_ctx.set("session")
+        try:
+            await BatchLoader(load_many).load("a")
+        finally:
+            _session_ctx.reset(token)
+        
+        assert seen == [None]
@@ -1,84 +1,129 @@
 """Tests for the main FastAPI application."""
 
+import asyncio
 import pytest
-from unittest.mock import AsyncMock, patch, MagicMock
-from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch, MagicMock, mock_open
 import httpx
+from types import SimpleNamespace
 
-from router_events.main import app, lifespan, process_device_event, lookup_manufacturer, get_device_attr, _parse_manufacturer_response, RateLimiter
+from router_events.main import app, lifespan, process_device_event, lookup_manufacturer, _parse_manufacturer_response, _devices_html, LookupWorker
 from router_events.models import Device, ManufacturerStatus
 from datetime import datetime
 
 
-@pytest.fixture
-def client():
-    """Create test client."""
-    return TestClient(app)
-
-
 @pytest.fixture
 def mock_device():
     """Mock device object."""
-    device = MagicMock()
-    device.mac = "00:11:22:33:44:55"
-    device.name = "Test Device"
-    device.notify = True
-    device.first_seen = datetime(2024, 1, 1, 10, 0, 0)
-    device.last_seen = datetime(2024, 1, 1, 12, 0, 0)
-    return device
+    return SimpleNamespace(
+        mac="00:11:22:33:44:55",
+        name="Test Device",
+        notify=True,
+        manufacturer=None,
+        first_seen=datetime(2024, 1, 1, 10, 0, 0),
+        last_seen=datetime(2024, 1, 1, 12, 0, 0),
+        lookup_due=False
+    )
 
 
-class TestRateLimiter:
-    """Test RateLimiter class."""
+class TestLookupWorker:
+    """Test LookupWorker class."""
 
+    @patch('router_events.main.lookup_manufacturer')
+    @patch('router_events.main.db')
     @pytest.mark.asyncio
-    async def test_rate_limiter_no_wait(self):
-        """Test rate limiter when no wait is needed."""
-        limiter = RateLimiter(interval=0.1)
-        await limiter.wait_if_needed()
-        # Should complete quickly
-        assert limiter.last_request > 0
-
+    async def test_worker_looks_up_claimed(self, mock_db, mock_lookup):
+        """Test queued MACs are claimed and looked up one at a time."""
+        mock_db.claim_manufacturer_lookup = AsyncMock(side_effect=[True, False])
+        done = asyncio.Event()
+        mock_lookup.side_effect = lambda mac, client, limiter: done.set()
+        
+        worker = LookupWorker(rate=1000)
+        worker.start(MagicMock())
+        worker.enqueue("00:11:22:33:44:55")
+        worker.enqueue("00:11:22:33:44:66")
+        await asyncio.wait_for(done.wait(), 1)
+        while worker.pending:
+            await asyncio.sleep(0)
+        await worker.stop()
+        
+        mock_lookup.assert_called_once()
+        assert mock_lookup.call_args.args[0] == "00:11:22:33:44:55"
+        assert mock_db.claim_manufacturer_lookup.call_count == 2
+
+    @patch('router_events.main.lookup_manufacturer')
+    @patch('router_events.main.db')
     @pytest.mark.asyncio
-    async def test_rate_limiter_with_wait(self):
-        """Test rate limiter enforces wait."""
-        limiter = RateLimiter(interval=0.1)
-        limiter.last_request = 999999999  # Force wait
-        start_time = limiter.last_request
-        await limiter.wait_if_needed()
-        assert limiter.last_request > start_time
+    async def test_worker_rate_limited(self, mock_db, mock_lookup):
+        """Test requests beyond the burst wait for the shared rate limit."""
+        mock_db.claim_manufacturer_lookup = AsyncMock(return_value=True)
+        
+        async def lookup(mac, client, limiter):
+            await limiter.acquire()
+        mock_lookup.side_effect = lookup
+        
+        worker = LookupWorker(rate=20, burst=1)
+        worker.start(MagicMock())
+        start = asyncio.get_running_loop().time()
+        worker.enqueue("00:11:22:33:44:55")
+        worker.enqueue("00:11:22:33:44:66")
+        while worker.pending:
+            await asyncio.sleep(0.01)
+        await worker.stop()
+        
+        assert mock_lookup.call_count == 2
+        assert asyncio.get_running_loop().time() - start >= 0.05
+
+    @patch('router_events.main.lookup_manufacturer')
+    @patch('router_events.main.db')
+    @pytest.mark.asyncio
+    async def test_workers_run_concurrently(self, mock_db, mock_lookup):
+        """Test a slow lookup does not hold up the other workers."""
+        mock_db.claim_manufacturer_lookup = AsyncMock(return_value=True)
+        release = asyncio.Event()
+        
+        async def lookup(mac, client, limiter):
+            if mac == "00:11:22:33:44:55":
+                await release.wait()
+        mock_lookup.side_effect = lookup
+        
+        worker = LookupWorker(rate=1000, workers=2)
+        worker.start(MagicMock())
+        worker.enqueue("00:11:22:33:44:55")
+        worker.enqueue("00:11:22:33:44:66")
+        while "00:11:22:33:44:66" in worker.pending:
+            await asyncio.sleep(0.01)
+        
+        assert worker.pending == {"00:11:22:33:44:55"}
+        release.set()
+        await worker.stop()
+        assert not worker.pending
+
+    @patch('router_events.main.lookup_manufacturer')
+    @patch('router_events.main.db')
+    @pytest.mark.asyncio
+    async def test_worker_survives_errors(self, mock_db, mock_lookup):
+        """Test a failing lookup does not stop the worker."""
+        mock_db.claim_manufacturer_lookup = AsyncMock(side_effect=[Exception("DB error"), True])
+        
+        worker = LookupWorker(rate=1000)
+        worker.start(MagicMock())
+        worker.enqueue("00:11:22:33:44:55")
+        worker.enqueue("00:11:22:33:44:66")
+        while worker.pending:
+            await asyncio.sleep(0.01)
+        await worker.stop()
+        
+        mock_lookup.assert_called_once()
 
 
 class TestUtilityFunctions:
     """Test utility functions."""
 
-    def test_get_device_attr_object(self):
-        """Test getting attribute from object."""
-        # Create a simple object without get method
-        class SimpleDevice:
-            def __init__(self):
-                self.name = "Test"
-        
-        device = SimpleDevice()
-        assert get_device_attr(device, 'name') == "Test"
-        assert get_device_attr(device, 'missing', 'default') == 'default'
-
-    def test_get_device_attr_dict(self):
-        """Test getting attribute from dict."""
-        device = {'name': 'Test'}
-        assert get_device_attr(device, 'name') == "Test"
-        assert get_device_attr(device, 'missing', 'default') == 'default'
-
-    def test_get_device_attr_neither(self):
-        """Test getting attribute from neither object nor dict."""
-        device = "not_dict_or_object"
-        assert get_device_attr(device, 'name', 'default') == 'default'
-
     @pytest.mark.asyncio
     async def test_parse_manufacturer_response_maclookup(self):
         """Test parsing maclookup.app response."""
         response = MagicMock()
-        response.json.return_value = {'company': 'Apple, Inc.'}
+        response.content = b'{"company": "Apple, Inc."}'
         result = await _parse_manufacturer_response(response, "https://maclookup.app/api")
         assert result == 'Apple, Inc.'
 
@@ -86,7 +131,7 @@ class TestUtilityFunctions:
     async def test_parse_manufacturer_response_maclookup_alt(self):
         """Test parsing maclookup.app response with companyName."""
         response = MagicMock()
-        response.json.return_value = {'companyName': 'Apple, Inc.'}
+        response.content = b'{"companyName": "Apple, Inc."}'
         result = await _parse_manufacturer_response(response, "https://maclookup.app/api")
         assert result == 'Apple, Inc.'
 
@@ -102,11 +147,22 @@ class TestUtilityFunctions:
     async def test_parse_manufacturer_response_json_error(self):
         """Test parsing response with JSON error."""
         response = MagicMock()
-        response.json.side_effect = ValueError("Invalid JSON")
+        response.content = b"Apple, Inc."
         response.text = "Apple, Inc."
         result = await _parse_manufacturer_response(response, "https://maclookup.app/api")
         assert result == "Apple, Inc."
 
+    @pytest.mark.asyncio
+    async def test_parse_manufacturer_response_text_on_maclookup_subdomain(self):
+        """Test the plain text maclookup.app endpoint is not parsed as JSON."""
+        response = MagicMock()
+        response.text = "Apple, Inc.\n"
+        result = await _parse_manufacturer_response(
+            response, "https://api.maclookup.app/v2/macs/00:11:22:33:44:55/company/name"
+        )
+        assert result == "Apple, Inc."
+        assert not response.json.called
+
 
 class TestLifespan:
     """Test application lifespan."""
@@ -124,6 +180,26 @@ class TestLifespan:
             mock_db.connect.assert_called_once()
             mock_db.close.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_lifespan_shares_http_client(self):
+        """Test lookups use one HTTP/2 client for the app's lifetime."""
+        with patch('router_events.main.db') as mock_db, \
+             patch('router_events.main.lookup_worker') as mock_worker, \
+             patch('router_events.main.notifier') as mock_notifier:
+            mock_db.connect = AsyncMock()
+            mock_db.close = AsyncMock()
+            mock_worker.stop = AsyncMock()
+            mock_notifier.close = AsyncMock()
+            
+            async with lifespan(app):
+                client = mock_worker.start.call_args.args[0]
+                assert isinstance(client, httpx.AsyncClient)
+                assert not client.is_closed
+            
+            mock_worker.stop.assert_called_once()
+            mock_notifier.close.assert_called_once()
+            assert client.is_closed
+
 
 class TestEndpoints:
     """Test API endpoints."""
@@ -140,12 +216,18 @@ class TestEndpoints:
         assert response.status_code == 307
         assert response.headers["location"] == "/devices.html"
 
-    @patch('router_events.main.FileResponse')
-    def test_devices_page(self, mock_file_response, client):
-        """Test devices HTML page."""
-        mock_file_response.return_value = MagicMock()
-        response = client.get("/devices.html")
-        mock_file_response.assert_called_once_with("static/devices.html")
+    def test_devices_page(self, client):
+        """Test devices HTML page is read once and served from memory."""
+        _devices_html.cache_clear()
+        with patch('builtins.open', mock_open(read_data=b"<html></html>")) as mock_file:
+            response = client.get("/devices.html")
+            response = client.get("/devices.html")
+        _devices_html.cache_clear()
+        
+        mock_file.assert_called_once_with("static/devices.html", "rb")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/html")
+        assert response.content == b"<html></html>"
 
     @patch('router_events.main.process_device_event')
     def test_receive_event_valid(self, mock_process, client):
@@ -162,39 +244,101 @@ class TestEndpoints:
         response = client.post("/api/events", json=event)
         assert response.status_code == 204
 
-    def test_receive_event_non_json(self, client):
-        """Test receiving non-JSON event."""
-        response = client.post("/api/events", content="not json", headers={"content-type": "text/plain"})
-        assert response.status_code == 204
-
-    def test_receive_event_invalid_json(self, client):
-        """Test receiving invalid JSON."""
-        response = client.post("/api/events", content="invalid json", headers={"content-type": "application/json"})
+    @patch('router_events.main.process_device_event', new_callable=AsyncMock)
+    def test_receive_event_batch(self, mock_process, client):
+        """Test receiving a list of events in one request."""
+        events = [
+            {"action": "assigned", "mac": "00:11:22:33:44:55", "ip": "192.168.1.100", "host": " phone "},
+            {"action": "released", "mac": "00:11:22:33:44:66", "ip": "192.168.1.101"},
+            {"action": "assigned", "mac": "00:11:22:33:44:77"}
+        ]
+        
+        response = client.post("/api/events", json=events)
         assert response.status_code == 204
+        assert mock_process.await_count == 2
+        mock_process.assert_any_await("00:11:22:33:44:55", "192.168.1.100", "phone")
+        mock_process.assert_any_await("00:11:22:33:44:77", "", "")
 
-    def test_receive_event_non_assigned(self, client):
-        """Test receiving non-assigned event."""
-        event = {"action": "released", "mac": "00:11:22:33:44:55"}
-        response = client.post("/api/events", json=event)
+    @patch('router_events.main.notifier')
+    @patch('router_events.main.db')
+    def test_receive_event_batch_same_mac(self, mock_db, mock_notifier, client):
+        """Test a new device seen twice in one batch is reported once."""
+        mock_db.upsert_device = AsyncMock(return_value=None)
+        mock_notifier.notify_unknown_device = AsyncMock()
+        events = [
+            {"action": "assigned", "mac": "00:11:22:33:44:55", "ip": "192.168.1.100", "host": "phone"},
+            {"action": "assigned", "mac": "00:11:22:33:44:55", "ip": "192.168.1.101"}
+        ]
+        
+        response = client.post("/api/events", json=events)
         assert response.status_code == 204
+        mock_db.upsert_device.assert_awaited_once_with("00:11:22:33:44:55", "phone")
+        mock_notifier.notify_unknown_device.assert_awaited_once_with(
+            "00:11:22:33:44:55", "192.168.1.101", "phone"
+        )
 
-    def test_receive_event_no_mac(self, client):
-        """Test receiving event without MAC."""
-        event = {"action": "assigned", "ip": "192.168.1.100"}
-        response = client.post("/api/events", json=event)
+    @pytest.mark.parametrize("content,content_type", [
+        ("not json", "text/plain"),
+        ("invalid json", "application/json"),
+        ('{"action": "released", "mac": "00:11:22:33:44:55"}', "application/json"),
+        ('{"action": "assigned", "ip": "192.168.1.100"}', "application/json")
+    ], ids=["non_json", "invalid_json", "non_assigned", "no_mac"])
+    @patch('router_events.main.process_device_event', new_callable=AsyncMock)
+    def test_receive_event_ignored(self, mock_process, client, content, content_type):
+        """Test events that are not processed are still acknowledged."""
+        response = client.post("/api/events", content=content, headers={"content-type": content_type})
         assert response.status_code == 204
+        mock_process.assert_not_called()
 
     @patch('router_events.main.db')
     def test_get_devices(self, mock_db, client, mock_device):
         """Test getting all devices."""
-        mock_db.get_devices = AsyncMock(return_value=[mock_device])
+        async def iter_device_batches():
+            yield [mock_device]
+            yield [mock_device]
+        mock_db.iter_device_batches = iter_device_batches
         
         response = client.get("/api/devices")
         assert response.status_code == 200
         data = response.json()
         assert "devices" in data
-        assert len(data["devices"]) == 1
+        assert len(data["devices"]) == 2
         assert data["devices"][0]["mac"] == "00:11:22:33:44:55"
+        assert data["devices"][0]["first_seen"] == "2024-01-01T10:00:00"
+
+    @patch('router_events.main.lookup_worker')
+    @patch('router_events.main.db')
+    def test_get_devices_queues_lookups(self, mock_db, mock_worker, client, mock_device):
+        """Test listing queues lookups for devices that are due one."""
+        # Reset for retry: the old 'Unknown' is still stored, but a lookup is due
+        retried = SimpleNamespace(mac="00:11:22:33:44:66", name=None, notify=False,
+                                  manufacturer="Unknown", first_seen=None, last_seen=None,
+                                  lookup_due=True)
+        known = SimpleNamespace(mac="00:11:22:33:44:77", name=None, notify=False,
+                                manufacturer="Apple, Inc.", first_seen=None, last_seen=None,
+                                lookup_due=False)
+        async def iter_device_batches():
+            yield [mock_device, retried, known]
+        mock_db.iter_device_batches = iter_device_batches
+        
+        response = client.get("/api/devices")
+        assert response.status_code == 200
+        assert response.json()["devices"][2]["manufacturer"] == "Apple, Inc."
+        assert "lookup_due" not in response.json()["devices"][0]
+        # mock_device has no manufacturer but is not due, e.g. a recent error
+        mock_worker.enqueue.assert_called_once_with("00:11:22:33:44:66")
+
+    @patch('router_events.main.db')
+    def test_get_devices_empty(self, mock_db, client):
+        """Test getting devices when there are none."""
+        async def iter_device_batches():
+            return
+            yield
+        mock_db.iter_device_batches = iter_device_batches
+        
+        response = client.get("/api/devices")
+        assert response.status_code == 200
+        assert response.json() == {"devices": []}
 
     @patch('router_events.main.db')
     def test_get_device_found(self, mock_db, client, mock_device):
@@ -206,6 +350,8 @@ class TestEndpoints:
         data = response.json()
         assert data["mac"] == "00:11:22:33:44:55"
         assert data["name"] == "Test Device"
+        assert data["manufacturer"] is None
+        assert data["first_seen"] == "2024-01-01T10:00:00"
 
     @patch('router_events.main.db')
     def test_get_device_not_found(self, mock_db, client):
@@ -247,21 +393,33 @@ class TestEndpoints:
     @patch('router_events.main.db')
     def test_get_manufacturer_cached(self, mock_db, client):
         """Test getting cached manufacturer."""
-        mock_db.get_manufacturer = AsyncMock(return_value="Apple, Inc.")
+        mock_db.get_manufacturer_state = AsyncMock(return_value=("Apple, Inc.", False))
         
         response = client.get("/api/manufacturer/00:11:22:33:44:55")
         assert response.status_code == 200
         assert response.json() == {"manufacturer": "Apple, Inc."}
 
     @patch('router_events.main.db')
-    def test_get_manufacturer_no_background_task(self, mock_db, client):
-        """Test manufacturer lookup when background task not needed."""
-        mock_db.get_manufacturer = AsyncMock(return_value=None)
-        mock_db.needs_manufacturer_lookup = AsyncMock(return_value=False)
+    @patch('router_events.main.lookup_worker')
+    def test_get_manufacturer_schedules_lookup(self, mock_worker, mock_db, client):
+        """Test manufacturer lookup is queued for the worker."""
+        mock_db.get_manufacturer_state = AsyncMock(return_value=(None, True))
         
         response = client.get("/api/manufacturer/00:11:22:33:44:55")
         assert response.status_code == 200
         assert response.json() == {"manufacturer": "Loading..."}
+        mock_worker.enqueue.assert_called_once_with("00:11:22:33:44:55")
+
+    @patch('router_events.main.db')
+    @patch('router_events.main.lookup_worker')
+    def test_get_manufacturer_lookup_not_due(self, mock_worker, mock_db, client):
+        """Test no lookup is queued while another one is in progress."""
+        mock_db.get_manufacturer_state = AsyncMock(return_value=(None, False))
+        
+        response = client.get("/api/manufacturer/00:11:22:33:44:55")
+        assert response.status_code == 200
+        assert response.json() == {"manufacturer": "Loading..."}
+        mock_worker.enqueue.assert_not_called()
 
     @patch('router_events.main.db')
     def test_retry_failed_lookups(self, mock_db, client):
@@ -274,14 +432,14 @@ class TestEndpoints:
 
     @patch('router_events.main.db')
     def test_retry_manufacturer_lookup_endpoint(self, mock_db, client):
-        """Test retry manufacturer lookup endpoint without background task."""
+        """Test retry manufacturer lookup endpoint queues a lookup."""
         mock_db.reset_manufacturer_lookup = AsyncMock()
         
-        # Mock the background task to avoid execution
-        with patch('router_events.main.lookup_manufacturer') as mock_lookup:
+        with patch('router_events.main.lookup_worker') as mock_worker:
             response = client.post("/api/manufacturer/00:11:22:33:44:55/retry")
             assert response.status_code == 200
             assert response.json() == {"message": "Manufacturer lookup reset for 00:11:22:33:44:55"}
+            mock_worker.enqueue.assert_called_once_with("00:11:22:33:44:55")
 
 
 class TestProcessDeviceEvent:
@@ -292,13 +450,12 @@ class TestProcessDeviceEvent:
     @pytest.mark.asyncio
     async def test_process_new_device(self, mock_notifier, mock_db):
         """Test processing event for new device."""
-        mock_db.get_device = AsyncMock(return_value=None)
-        mock_db.add_device = AsyncMock()
+        mock_db.upsert_device = AsyncMock(return_value=None)
         mock_notifier.notify_unknown_device = AsyncMock()
         
         await process_device_event("00:11:22:33:44:55", "192.168.1.100", "test-host")
         
-        mock_db.add_device.assert_called_once_with("00:11:22:33:44:55", "test-host")
+        mock_db.upsert_device.assert_called_once_with("00:11:22:33:44:55", "test-host")
         mock_notifier.notify_unknown_device.assert_called_once_with(
             "00:11:22:33:44:55", "192.168.1.100", "test-host"
         )
@@ -308,13 +465,12 @@ class TestProcessDeviceEvent:
     @pytest.mark.asyncio
     async def test_process_existing_device_notify(self, mock_notifier, mock_db, mock_device):
         """Test processing event for existing device with notifications."""
-        mock_db.get_device = AsyncMock(return_value=mock_device)
-        mock_db.add_device = AsyncMock()
+        mock_db.upsert_device = AsyncMock(return_value=mock_device)
         mock_notifier.notify_tracked_device = AsyncMock()
         
         await process_device_event("00:11:22:33:44:55", "192.168.1.100", "test-host")
         
-        mock_db.add_device.assert_called_once_with("00:11:22:33:44:55", "test-host")
+        mock_db.upsert_device.assert_called_once_with("00:11:22:33:44:55", "test-host")
         mock_notifier.notify_tracked_device.assert_called_once_with(
             "Test Device", "00:11:22:33:44:55", "192.168.1.100"
         )
@@ -324,12 +480,9 @@ class TestProcessDeviceEvent:
     @pytest.mark.asyncio
     async def test_process_existing_device_no_notify(self, mock_notifier, mock_db):
         """Test processing event for existing device without notifications."""
-        device = MagicMock()
-        device.name = "Test Device"
-        device.notify = False
+        device = SimpleNamespace(name="Test Device", notify=False)
         
-        mock_db.get_device = AsyncMock(return_value=device)
-        mock_db.add_device = AsyncMock()
+        mock_db.upsert_device = AsyncMock(return_value=device)
         mock_notifier.notify_tracked_device = AsyncMock()
         
         await process_device_event("00:11:22:33:44:55", "192.168.1.100", "test-host")
@@ -341,71 +494,79 @@ class TestManufacturerLookup:
     """Test manufacturer lookup functionality."""
 
     @patch('router_events.main.db')
-    @patch('router_events.main.pending_lookups', set())
-    @patch('router_events.main.rate_limiter')
     @pytest.mark.asyncio
-    async def test_lookup_manufacturer_already_pending(self, mock_limiter, mock_db):
-        """Test lookup when already pending."""
-        from router_events.main import pending_lookups
-        pending_lookups.add("00:11:22:33:44:55")
+    async def test_lookup_manufacturer_success(self, mock_db, mock_limiter):
+        """Test successful manufacturer lookup."""
+        mock_db.set_manufacturer = AsyncMock()
+        
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.text = "Apple, Inc."
+        
+        mock_client = MagicMock()
+        mock_client.get = AsyncMock(return_value=mock_response)
         
-        await lookup_manufacturer("00:11:22:33:44:55")
+        await lookup_manufacturer("00:11:22:33:44:55", mock_client, mock_limiter)
         
-        mock_db.needs_manufacturer_lookup.assert_not_called()
+        mock_db.set_manufacturer.assert_any_call("00:11:22:33:44:55", "Apple, Inc.", 'found')
 
+    @patch('router_events.main.asyncio.sleep', new_callable=AsyncMock)
     @patch('router_events.main.db')
-    @patch('router_events.main.pending_lookups', set())
-    @patch('router_events.main.rate_limiter')
     @pytest.mark.asyncio
-    async def test_lookup_manufacturer_not_needed(self, mock_limiter, mock_db):
-        """Test lookup when not needed."""
-        mock_db.needs_manufacturer_lookup = AsyncMock(return_value=False)
+    async def test_lookup_manufacturer_all_fail(self, mock_db, mock_sleep, mock_limiter):
+        """Test manufacturer lookup when all APIs fail."""
+        mock_db.set_manufacturer = AsyncMock()
         
-        await lookup_manufacturer("00:11:22:33:44:55")
+        mock_client = MagicMock()
+        mock_client.get = AsyncMock(side_effect=httpx.RequestError("Network error"))
         
-        mock_db.set_manufacturer.assert_not_called()
+        await lookup_manufacturer("00:11:22:33:44:55", mock_client, mock_limiter)
+        
+        # Every API is retried, then the lookup is left for a later retry
+        assert mock_client.get.call_count == 9
+        assert mock_limiter.acquire.await_count == 9
+        assert mock_sleep.call_count == 6
+        mock_db.set_manufacturer.assert_called_once_with("00:11:22:33:44:55", None, 'error')
 
+    @patch('router_events.main.asyncio.sleep', new_callable=AsyncMock)
     @patch('router_events.main.db')
-    @patch('router_events.main.pending_lookups', set())
-    @patch('router_events.main.rate_limiter')
-    @patch('httpx.AsyncClient')
     @pytest.mark.asyncio
-    async def test_lookup_manufacturer_success(self, mock_client_class, mock_limiter, mock_db):
-        """Test successful manufacturer lookup."""
-        mock_db.needs_manufacturer_lookup = AsyncMock(return_value=True)
+    async def test_lookup_manufacturer_retries_throttled(self, mock_db, mock_sleep, mock_limiter):
+        """Test throttled and failing requests are retried with growing delays."""
         mock_db.set_manufacturer = AsyncMock()
-        mock_limiter.wait_if_needed = AsyncMock()
         
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.text = "Apple, Inc."
+        throttled = MagicMock(status_code=429)
+        success = MagicMock(status_code=200, text="Apple, Inc.")
         
         mock_client = MagicMock()
-        mock_client.get = AsyncMock(return_value=mock_response)
-        mock_client_class.return_value.__aenter__.return_value = mock_client
+        mock_client.get = AsyncMock(side_effect=[throttled, httpx.RequestError("Network error"), success])
         
-        await lookup_manufacturer("00:11:22:33:44:55")
+        await lookup_manufacturer("00:11:22:33:44:55", mock_client, mock_limiter)
         
-        mock_db.set_manufacturer.assert_any_call("00:11:22:33:44:55", None, 'pending')
-        mock_db.set_manufacturer.assert_any_call("00:11:22:33:44:55", "Apple, Inc.", 'found')
+        mock_db.set_manufacturer.assert_called_once_with("00:11:22:33:44:55", "Apple, Inc.", 'found')
+        # A 429 pauses all workers through the shared bucket, an error only backs off this one
+        mock_limiter.pause.assert_called_once()
+        assert 0.5 <= mock_limiter.pause.call_args.args[0] <= 1.5
+        mock_sleep.assert_called_once()
+        assert 1.0 <= mock_sleep.call_args.args[0] <= 3.0
+        assert mock_limiter.acquire.await_count == 3
 
+    @patch('router_events.main.asyncio.sleep', new_callable=AsyncMock)
     @patch('router_events.main.db')
-    @patch('router_events.main.pending_lookups', set())
-    @patch('router_events.main.rate_limiter')
-    @patch('httpx.AsyncClient')
     @pytest.mark.asyncio
-    async def test_lookup_manufacturer_all_fail(self, mock_client_class, mock_limiter, mock_db):
-        """Test manufacturer lookup when all APIs fail."""
-        mock_db.needs_manufacturer_lookup = AsyncMock(return_value=True)
+    async def test_lookup_manufacturer_unavailable_then_not_found(self, mock_db, mock_sleep, mock_limiter):
+        """Test an API without data marks the MAC unknown even if another API is down."""
         mock_db.set_manufacturer = AsyncMock()
-        mock_limiter.wait_if_needed = AsyncMock()
+        
+        unavailable = MagicMock(status_code=503)
+        not_found = MagicMock(status_code=404)
         
         mock_client = MagicMock()
-        mock_client.get = AsyncMock(side_effect=httpx.RequestError("Network error"))
-        mock_client_class.return_value.__aenter__.return_value = mock_client
+        mock_client.get = AsyncMock(side_effect=[unavailable] * 3 + [not_found] * 2)
         
-        await lookup_manufacturer("00:11:22:33:44:55")
+        await lookup_manufacturer("00:11:22:33:44:55", mock_client, mock_limiter)
         
-        mock_db.set_manufacturer.assert_any_call("00:11:22:33:44:55", 'Unknown', 'unknown')
+        assert mock_client.get.call_count == 5
+        mock_db.set_manufacturer.assert_called_once_with("00:11:22:33:44:55", 'Unknown', 'unknown')
 
 
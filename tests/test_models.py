@@ -3,6 +3,7 @@
 import pytest
 from datetime import datetime
 
+from router_events.database import DEVICE_COLUMNS
 from router_events.models import Device, ManufacturerStatus
 
 
@@ -67,3 +68,28 @@ class TestDevice:
         # Note: notify default is set by SQLAlchemy column definition
         assert device.manufacturer is None
         assert device.manufacturer_last_attempt is None
+
+    def test_manufacturer_index(self):
+        """Test composite index on manufacturer lookup columns."""
+        indexes = {index.name: index for index in Device.__table__.indexes}
+        index = indexes['idx_mfr_status_attempt']
+        assert [c.name for c in index.columns] == [
+            'manufacturer_status', 'manufacturer_last_attempt'
+        ]
+
+    def test_listing_index(self):
+        """Test covering index on the device listing columns."""
+        indexes = {index.name: index for index in Device.__table__.indexes}
+        index = indexes['idx_device_listing_due']
+        assert index.columns[0].name == 'last_seen'
+        listed = {'name', 'notify', 'manufacturer', 'first_seen', 'last_seen'}
+        due = {'manufacturer_status', 'manufacturer_last_attempt'}
+        assert {c.name for c in index.columns} == listed | due
+        assert {c.key for c in DEVICE_COLUMNS} - {'mac'} == listed
+
+    def test_manufacturer_display_generated(self):
+        """Test manufacturer display is a virtual generated column."""
+        column = Device.__table__.c.manufacturer_display
+        assert column.computed is not None
+        assert column.computed.persisted is False
+        assert "'Unknown'" in str(column.computed.sqltext)
@@ -7,6 +7,15 @@ import httpx
 from router_events.notifications import NotificationService
 
 
+@pytest.fixture
+def mock_client():
+    """Mock HTTP client returned by httpx.AsyncClient."""
+    client = AsyncMock()
+    client.post = AsyncMock(return_value=MagicMock())
+    with patch('httpx.AsyncClient', return_value=client):
+        yield client
+
+
 class TestNotificationService:
     """Test notification service."""
 
@@ -34,6 +43,12 @@ class TestNotificationService:
             assert service.token == 'test-token'
             assert service.enabled is False
 
+    @pytest.mark.parametrize("value,enabled", [("1", True), ("YES", True), ("0", False), ("no", False)])
+    def test_init_enabled_values(self, value, enabled):
+        """Test the accepted spellings of NTFY_ENABLED."""
+        with patch.dict('os.environ', {'NTFY_ENABLED': value}):
+            assert NotificationService().enabled is enabled
+
     @pytest.mark.asyncio
     async def test_send_disabled(self):
         """Test sending notification when disabled."""
@@ -45,92 +60,86 @@ class TestNotificationService:
             mock_client.assert_not_called()
 
     @pytest.mark.asyncio
-    async def test_send_success_no_token(self):
+    async def test_send_success_no_token(self, mock_client):
         """Test successful notification without token."""
         service = NotificationService()
         service.enabled = True
         service.token = None
         
-        mock_response = MagicMock()
-        mock_response.raise_for_status = MagicMock()
+        await service.send("Test Title", "Test Message", "high")
         
-        mock_client = AsyncMock()
-        mock_client.post = AsyncMock(return_value=mock_response)
-        
-        with patch('httpx.AsyncClient') as mock_client_class:
-            mock_client_class.return_value.__aenter__.return_value = mock_client
-            
-            await service.send("Test Title", "Test Message", "high")
-            
-            mock_client.post.assert_called_once_with(
-                f"{service.url}/{service.topic}",
-                data="Test Message",
-                headers={"Title": "Test Title", "Priority": "high"}
-            )
+        mock_client.post.assert_called_once_with(
+            f"{service.url}/{service.topic}",
+            data="Test Message",
+            headers={"Title": "Test Title", "Priority": "high"}
+        )
 
     @pytest.mark.asyncio
-    async def test_send_success_with_token(self):
+    async def test_send_success_with_token(self, mock_client):
         """Test successful notification with token."""
         service = NotificationService()
         service.enabled = True
         service.token = "test-token"
         
-        mock_response = MagicMock()
-        mock_response.raise_for_status = MagicMock()
-        
-        mock_client = AsyncMock()
-        mock_client.post = AsyncMock(return_value=mock_response)
+        await service.send("Test Title", "Test Message")
         
-        with patch('httpx.AsyncClient') as mock_client_class:
-            mock_client_class.return_value.__aenter__.return_value = mock_client
-            
-            await service.send("Test Title", "Test Message")
-            
-            expected_headers = {
-                "Title": "Test Title",
-                "Priority": "default",
-                "Authorization": "Bearer test-token"
-            }
-            mock_client.post.assert_called_once_with(
-                f"{service.url}/{service.topic}",
-                data="Test Message",
-                headers=expected_headers
-            )
+        expected_headers = {
+            "Title": "Test Title",
+            "Priority": "default",
+            "Authorization": "Bearer test-token"
+        }
+        mock_client.post.assert_called_once_with(
+            f"{service.url}/{service.topic}",
+            data="Test Message",
+            headers=expected_headers
+        )
 
     @pytest.mark.asyncio
-    async def test_send_request_error(self):
+    async def test_send_request_error(self, mock_client):
         """Test notification with request error."""
         service = NotificationService()
         service.enabled = True
+        mock_client.post.side_effect = httpx.RequestError("Network error")
         
-        mock_client = AsyncMock()
-        mock_client.post = AsyncMock(side_effect=httpx.RequestError("Network error"))
-        
-        with patch('httpx.AsyncClient') as mock_client_class:
-            mock_client_class.return_value.__aenter__.return_value = mock_client
-            
-            # Should not raise exception
-            await service.send("Test", "Message")
+        # Should not raise exception
+        await service.send("Test", "Message")
 
     @pytest.mark.asyncio
-    async def test_send_http_error(self):
+    async def test_send_http_error(self, mock_client):
         """Test notification with HTTP error."""
         service = NotificationService()
         service.enabled = True
-        
-        mock_response = MagicMock()
-        mock_response.raise_for_status = MagicMock(side_effect=httpx.HTTPStatusError(
+        mock_client.post.return_value.raise_for_status.side_effect = httpx.HTTPStatusError(
             "Bad request", request=None, response=None
-        ))
+        )
+        
+        # Should not raise exception
+        await service.send("Test", "Message")
+        mock_client.post.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_send_reuses_client(self):
+        """Test notifications share one client until closed."""
+        service = NotificationService()
+        service.enabled = True
         
         mock_client = AsyncMock()
-        mock_client.post = AsyncMock(return_value=mock_response)
+        mock_client.post = AsyncMock(return_value=MagicMock())
         
-        with patch('httpx.AsyncClient') as mock_client_class:
-            mock_client_class.return_value.__aenter__.return_value = mock_client
+        with patch('httpx.AsyncClient', return_value=mock_client) as mock_client_class:
+            await service.send("First", "Message")
+            await service.send("Second", "Message")
             
-            # Should not raise exception
-            await service.send("Test", "Message")
+            mock_client_class.assert_called_once_with(timeout=10.0)
+            assert mock_client.post.call_count == 2
+            
+            await service.close()
+            mock_client.aclose.assert_called_once()
+            assert service._client is None
+            
+            # Closing again is a no-op
+            await service.close()
+            mock_client.aclose.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_notify_unknown_device_with_hostname(self):
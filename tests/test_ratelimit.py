@@ -0,0 +1,73 @@
+"""Tests for rate limiting."""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from router_events.ratelimit import TokenBucket
+
+
+def _advance(mock_time, seconds):
+    """Move the mocked monotonic clock forward, as a sleep would."""
+    mock_time.monotonic.return_value += seconds
+
+
+class TestTokenBucket:
+    """Test TokenBucket class."""
+
+    @patch('router_events.ratelimit.asyncio.sleep', new_callable=AsyncMock)
+    @patch('router_events.ratelimit.time')
+    @pytest.mark.asyncio
+    async def test_burst_without_waiting(self, mock_time, mock_sleep):
+        """Test a full bucket allows capacity acquisitions at once."""
+        mock_time.monotonic.return_value = 100.0
+        bucket = TokenBucket(rate=2, capacity=2)
+
+        await bucket.acquire()
+        await bucket.acquire()
+
+        mock_sleep.assert_not_called()
+
+    @patch('router_events.ratelimit.asyncio.sleep', new_callable=AsyncMock)
+    @patch('router_events.ratelimit.time')
+    @pytest.mark.asyncio
+    async def test_waits_when_empty(self, mock_time, mock_sleep):
+        """Test an empty bucket waits for the next token to accrue."""
+        mock_time.monotonic.return_value = 100.0
+        mock_sleep.side_effect = lambda seconds: _advance(mock_time, seconds)
+        bucket = TokenBucket(rate=2, capacity=2)
+        await bucket.acquire()
+        await bucket.acquire()
+
+        mock_time.monotonic.return_value = 100.25
+        await bucket.acquire()
+
+        mock_sleep.assert_called_once_with(pytest.approx(0.25))
+
+    @patch('router_events.ratelimit.asyncio.sleep', new_callable=AsyncMock)
+    @patch('router_events.ratelimit.time')
+    @pytest.mark.asyncio
+    async def test_refill_capped(self, mock_time, mock_sleep):
+        """Test idle time refills no more than capacity tokens."""
+        mock_time.monotonic.return_value = 100.0
+        bucket = TokenBucket(rate=2, capacity=2)
+
+        mock_time.monotonic.return_value = 200.0
+        for _ in range(3):
+            await bucket.acquire()
+
+        mock_sleep.assert_called_once_with(pytest.approx(0.5))
+
+    @patch('router_events.ratelimit.asyncio.sleep', new_callable=AsyncMock)
+    @patch('router_events.ratelimit.time')
+    @pytest.mark.asyncio
+    async def test_pause(self, mock_time, mock_sleep):
+        """Test a pause holds back a full bucket for the given time."""
+        mock_time.monotonic.return_value = 100.0
+        mock_sleep.side_effect = lambda seconds: _advance(mock_time, seconds)
+        bucket = TokenBucket(rate=2, capacity=2)
+        
+        bucket.pause(3.0)
+        await bucket.acquire()
+        
+        mock_sleep.assert_called_once_with(pytest.approx(3.0))
+        assert mock_time.monotonic.return_value == pytest.approx(103.0)
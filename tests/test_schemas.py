@@ -38,51 +38,33 @@ class TestEventRequest:
         event = EventRequest(**data)
         assert event.host is None
 
-    def test_mac_validation_valid_colon(self):
-        """Test MAC validation with colons."""
+    @pytest.mark.parametrize("mac,expected", [
+        ("00:11:22:33:44:55", "00:11:22:33:44:55"),
+        ("00-11-22-33-44-55", "00-11-22-33-44-55"),
+        ("AA:BB:CC:DD:EE:FF", "aa:bb:cc:dd:ee:ff")
+    ])
+    def test_mac_validation_valid(self, mac, expected):
+        """Test MAC validation accepts colons and dashes and lowercases the address."""
         data = {
             "action": "assigned",
-            "mac": "00:11:22:33:44:55",
-            "ip": "192.168.1.100"
-        }
-        event = EventRequest(**data)
-        assert event.mac == "00:11:22:33:44:55"
-
-    def test_mac_validation_valid_dash(self):
-        """Test MAC validation with dashes."""
-        data = {
-            "action": "assigned",
-            "mac": "00-11-22-33-44-55",
-            "ip": "192.168.1.100"
-        }
-        event = EventRequest(**data)
-        assert event.mac == "00-11-22-33-44-55"
-
-    def test_mac_validation_case_conversion(self):
-        """Test MAC address case conversion."""
-        data = {
-            "action": "assigned",
-            "mac": "AA:BB:CC:DD:EE:FF",
+            "mac": mac,
             "ip": "192.168.1.100"
         }
         event = EventRequest(**data)
-        assert event.mac == "aa:bb:cc:dd:ee:ff"
-
-    def test_mac_validation_invalid_length(self):
-        """Test MAC validation with invalid length."""
-        data = {
-            "action": "assigned",
-            "mac": "00:11:22:33:44",
-            "ip": "192.168.1.100"
-        }
-        with pytest.raises(ValidationError):
-            EventRequest(**data)
-
-    def test_mac_validation_invalid_format(self):
-        """Test MAC validation with invalid format."""
+        assert event.mac == expected
+
+    @pytest.mark.parametrize("mac", [
+        "00:11:22:33:44",
+        "00.11.22.33.44.55",
+        "00:11:22:33:44:GG",
+        "00:11-22:33:44:55",
+        "00:11:22:33:44:55\n"
+    ])
+    def test_mac_validation_invalid(self, mac):
+        """Test MAC validation rejects wrong lengths, separators and non-hex octets."""
         data = {
             "action": "assigned",
-            "mac": "00.11.22.33.44.55",
+            "mac": mac,
             "ip": "192.168.1.100"
         }
         with pytest.raises(ValidationError):
@@ -120,6 +102,7 @@ class TestDeviceResponse:
         
         assert response.name is None
         assert response.notify is False
+        assert response.manufacturer is None
 
 
 class TestDevicesResponse: